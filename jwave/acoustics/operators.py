@@ -13,6 +13,7 @@
 # You should have received a copy of the GNU Lesser General Public
 # License along with j-Wave. If not, see <https://www.gnu.org/licenses/>.
 
+import jax
 from jax import numpy as jnp
 from jaxdf import Field, operator
 from jaxdf.discretization import (
@@ -21,19 +22,14 @@ from jaxdf.discretization import (
     FourierSeries,
     OnGrid,
 )
-from jaxdf.operators import (
-    compose,
-    diag_jacobian,
-    functional,
-    gradient,
-    shift_operator,
-    sum_over_dims,
-)
+from jaxdf.operators import diag_jacobian, functional, gradient, sum_over_dims
+from plum import dispatch
 
 from jwave.geometry import Medium
 
 from .conversion import db2neper
 from .pml import complex_pml, complex_pml_on_grid
+from .spectral import _on_axis
 
 
 @operator
@@ -99,7 +95,49 @@ def laplacian_with_pml(u: OnGrid, medium: Medium, *, omega=1.0, params=None) ->
     return nabla_u - rho_u, None
 
 
-@operator
+def _complex_dtype(u: OnGrid):
+    # The PML, the derivative multipliers and the density terms follow the
+    # precision of the field, such that a complex64 field is not promoted to
+    # complex128 when 64-bit mode is enabled in jax.
+    return jnp.result_type(u.params, jnp.complex64)
+
+
+def _real_dtype(u: OnGrid):
+    return jnp.finfo(_complex_dtype(u)).dtype
+
+
+def _cast_params(params, dtype):
+    return jax.tree_util.tree_map(lambda x: jnp.asarray(x, dtype=dtype), params)
+
+
+def fd_laplacian_with_pml_params(u: FiniteDifferences, medium: Medium, *, omega=1.0):
+    r"""Initializes the parameters of `laplacian_with_pml` for `FiniteDifferences`
+    fields: the staggered PML and the stencils of the derivative operators.
+    """
+    dtype = _complex_dtype(u)
+    stencils = {
+        "gradient": gradient.default_params(u, stagger=[0.5]),
+        "gradient_unstaggered": gradient.default_params(u),
+        "diag_jacobian": diag_jacobian.default_params(u, stagger=[-0.5]),
+    }
+    return {
+        "pml_on_grid": [
+            u.replace_params(
+                complex_pml_on_grid(medium, omega, shift=u.domain.dx[0] / 2).astype(
+                    dtype
+                )
+            ),
+            u.replace_params(
+                complex_pml_on_grid(medium, omega, shift=-u.domain.dx[0] / 2).astype(
+                    dtype
+                )
+            ),
+        ],
+        "stencils": _cast_params(stencils, _real_dtype(u)),
+    }
+
+
+@operator(init_params=fd_laplacian_with_pml_params)
 def laplacian_with_pml(
     u: FiniteDifferences, medium: Medium, *, omega=1.0, params=None
 ) -> FiniteDifferences:
@@ -116,21 +154,7 @@ def laplacian_with_pml(
     """
     rho0 = medium.density
     if params == None:
-        params = {
-            "pml_on_grid": [
-                u.replace_params(
-                    complex_pml_on_grid(medium, omega, shift=u.domain.dx[0] / 2)
-                ),
-                u.replace_params(
-                    complex_pml_on_grid(medium, omega, shift=-u.domain.dx[0] / 2)
-                ),
-            ],
-            "stencils": {
-                "gradient": gradient.default_params(u, stagger=[0.5]),
-                "gradient_unstaggered": gradient.default_params(u),
-                "diag_jacobian": diag_jacobian.default_params(u, stagger=[-0.5]),
-            },
-        }
+        params = fd_laplacian_with_pml_params(u, medium, omega=omega)
 
     pml = params["pml_on_grid"]
     stencils = params["stencils"]
@@ -147,14 +171,52 @@ def laplacian_with_pml(
         # Assume it is a number
         rho_u = 0.0
     else:
-        grad_u = gradient(u, params=stencils["gradient_unstaggered"])
+        rho0 = rho0.replace_params(rho0.params.astype(_real_dtype(u)))
         grad_rho0 = gradient(rho0, stagger=[0], params=stencils["gradient_unstaggered"])
         rho_u = sum_over_dims(mod_grad_u * grad_rho0) / rho0
 
     return nabla_u - rho_u, params
 
 
-@operator
+def fourier_laplacian_with_pml_params(u: FourierSeries, medium: Medium, *, omega=1.0):
+    r"""Initializes the parameters of `laplacian_with_pml` for `FourierSeries`
+    fields. Those are the staggered PML and the spectral multipliers of the
+    staggered derivatives, stored as one 1D array per axis.
+    """
+    dx = u.domain.dx
+    k_vec = u._freq_axis
+    dtype = _complex_dtype(u)
+
+    def staggered_k(stagger):
+        return [
+            (1j * k * jnp.exp(1j * k * stagger * d)).astype(dtype)
+            for k, d in zip(k_vec, dx)
+        ]
+
+    def pml(shift):
+        return complex_pml_on_grid(medium, omega, shift=shift).astype(dtype)
+
+    params = {
+        "pml_on_grid": [
+            u.replace_params(pml(dx[0] / 2)),
+            u.replace_params(pml(-dx[0] / 2)),
+        ],
+        "k_staggered": {
+            "forward": staggered_k(0.5),
+            "backward": staggered_k(-0.5),
+            "shift": [
+                jnp.exp(-1j * k * d / 2).astype(dtype) for k, d in zip(k_vec, dx)
+            ],
+        },
+    }
+    if isinstance(medium.density, FourierSeries):
+        params["fft_rho0"] = _cast_params(
+            gradient.default_params(medium.density), _real_dtype(u)
+        )
+    return params
+
+
+@operator(init_params=fourier_laplacian_with_pml_params)
 def laplacian_with_pml(
     u: FourierSeries, medium: Medium, *, omega=1.0, params=None
 ) -> FourierSeries:
@@ -169,54 +231,106 @@ def laplacian_with_pml(
     Returns:
       FourierSeries: Modified Laplacian operator applied to `u`.
     """
-    rho0 = medium.density
-
     # Initialize pml parameters if not provided
     if params == None:
-        params = {
-            "pml_on_grid": [
-                u.replace_params(
-                    complex_pml_on_grid(medium, omega, shift=u.domain.dx[0] / 2)
-                ),
-                u.replace_params(
-                    complex_pml_on_grid(medium, omega, shift=-u.domain.dx[0] / 2)
-                ),
-            ],
-            "fft_u": gradient.default_params(u),
-        }
+        params = fourier_laplacian_with_pml_params(u, medium, omega=omega)
 
-    pml = params["pml_on_grid"]
+    nabla_u = _fourier_laplacian_with_pml(u, medium, params)
+    return u.replace_params(jnp.expand_dims(nabla_u, -1)), params
 
-    # Making laplacian
-    grad_u = gradient(u, stagger=[0.5], correct_nyquist=False, params=params["fft_u"])
-    mod_grad_u = grad_u * pml[0]
-    mod_diag_jacobian = (
-        diag_jacobian(
-            mod_grad_u, stagger=[-0.5], correct_nyquist=False, params=params["fft_u"]
-        )
-        * pml[1]
+
+def _fourier_laplacian_with_pml(u, medium, params, k_mod=None):
+    r"""Evaluates the modified laplacian on the grid values of the
+    `FourierSeries` field `u`. If `k_mod` is given, the wavenumber term
+    `u * k_mod` is added within the same kernel."""
+    pml = [p.params for p in params["pml_on_grid"]]
+    k_op = params["k_staggered"]
+
+    if isinstance(k_mod, Field):
+        k_mod = k_mod.on_grid
+    if k_mod is not None and jnp.ndim(k_mod) > 0:
+        # Medium properties given as fields or raw arrays carry the trailing
+        # channel axis of the grid values
+        k_mod = jnp.broadcast_to(k_mod, u.params.shape)[..., 0]
+
+    density_terms = _fourier_density_terms(medium.density, params)
+    return _laplacian_with_pml_kernel(
+        u.params[..., 0], pml, k_op, k_mod=k_mod, **density_terms
     )
-    nabla_u = sum_over_dims(mod_diag_jacobian)
 
-    # Density term
-    if not (issubclass(type(rho0), Field)):
-        # Assume it is a number
-        rho_u = 0.0
-    else:
-        assert isinstance(
-            rho0, FourierSeries
-        ), "rho0 must be a FourierSeries or a number when used with FourierSeries fields"
 
-        if not ("fft_rho0" in params.keys()):
-            params["fft_rho0"] = gradient.default_params(rho0)
+@dispatch
+def _fourier_density_terms(rho0: object, params) -> dict:
+    # Homogeneous density: the density term vanishes
+    return {}
 
-        grad_rho0 = gradient(rho0, stagger=[0.5], params=params["fft_rho0"])
-        dx = list(map(lambda x: -x / 2, u.domain.dx))
-        _ru = shift_operator(mod_grad_u * grad_rho0, dx=dx)
-        rho_u = sum_over_dims(_ru) / rho0
 
-    # Put everything together
-    return nabla_u - rho_u, params
+@dispatch
+def _fourier_density_terms(rho0: Field, params) -> dict:
+    raise TypeError(
+        "rho0 must be a FourierSeries or a number when used with FourierSeries fields"
+    )
+
+
+@dispatch
+def _fourier_density_terms(rho0: FourierSeries, params) -> dict:
+    if not ("fft_rho0" in params.keys()):
+        params["fft_rho0"] = gradient.default_params(rho0)
+
+    return {"rho0": rho0, "fft_rho0": params["fft_rho0"]}
+
+
+def _fft_multiply(u, k_op, axis):
+    r"""Multiplies the 1D Fourier transform of `u` along `axis` by the
+    1D spectral operator `k_op`, which is broadcasted along that axis."""
+    Fu = jnp.fft.fft(u, axis=axis)
+    return jnp.fft.ifft(Fu * _on_axis(k_op, axis, u.ndim), axis=axis)
+
+
+@jax.jit
+def _laplacian_with_pml_kernel(u, pml, k_op, rho0=None, fft_rho0=None, k_mod=None):
+    r"""Modified laplacian for the grid values of a complex `FourierSeries`
+    field. The whole operator is traced as a single function, such that
+    the pointwise products with the PML and the density terms can be fused
+    with the surrounding FFTs. The compiled kernel is cached by jax for each
+    shape and dtype of the inputs.
+
+    When `rho0` is `None` the density is assumed to be homogeneous. Otherwise
+    `rho0` is the `FourierSeries` density and `fft_rho0` the parameters of its
+    gradient, which is evaluated within the kernel as well. Since
+    `None` is part of the tree structure of the inputs, the homogeneous and
+    heterogeneous versions of the operator are compiled separately. The
+    same holds for the optional wavenumber term `k_mod`, used by `helmholtz`.
+    """
+    ndim = u.ndim
+
+    # Modified gradient and divergence, staggered forward and backward
+    mod_grad_u = [
+        _fft_multiply(u, k_op["forward"][ax], ax) * pml[0][..., ax]
+        for ax in range(ndim)
+    ]
+    nabla_u = sum(
+        _fft_multiply(mod_grad_u[ax], k_op["backward"][ax], ax) * pml[1][..., ax]
+        for ax in range(ndim)
+    )
+
+    if rho0 is not None:
+        # Density term, shifted back on the collocation grid. The density is
+        # evaluated in the precision of the field
+        real_dtype = u.real.dtype
+        rho0 = rho0.replace_params(rho0.params.astype(real_dtype))
+        grad_rho0 = gradient(rho0, stagger=[0.5], params=fft_rho0).params
+        grad_rho0 = grad_rho0.astype(real_dtype)
+        rho_u = sum(
+            _fft_multiply(mod_grad_u[ax] * grad_rho0[..., ax], k_op["shift"][ax], ax)
+            for ax in range(ndim)
+        )
+        nabla_u = nabla_u - rho_u / rho0.params[..., 0]
+
+    if k_mod is not None:
+        nabla_u = nabla_u + u * k_mod
+
+    return nabla_u
 
 
 @operator
@@ -232,12 +346,15 @@ def wavevector(u: Field, medium: Medium, *, omega=1.0, params=None) -> Field:
     Returns:
       Field: Wavevector operator applied to `u`.
     """
+    return u * _wavevector_multiplier(medium, omega), None
+
+
+def _wavevector_multiplier(medium: Medium, omega):
     c = medium.sound_speed
-    alpha = medium.attenuation
-    trans_fun = lambda x: db2neper(x, 2.0)
-    alpha = compose(alpha)(trans_fun)
-    k_mod = (omega / c) ** 2 + 2j * (omega**3) * alpha / c
-    return u * k_mod, None
+    # The conversion to nepers is a constant scaling, applied directly
+    # instead of composing a new field with the conversion function
+    alpha = db2neper(medium.attenuation, 2.0)
+    return (omega / c) ** 2 + 2j * (omega**3) * alpha / c
 
 
 @operator
@@ -261,7 +378,13 @@ def helmholtz(u: Field, medium: Medium, *, omega=1.0, params=None) -> Field:
     return L + k, None
 
 
-@operator
+def helmholtz_params(u: OnGrid, medium: Medium, *, omega=1.0):
+    r"""Initializes the parameters of `helmholtz` for `OnGrid` fields, which
+    are the ones of the underlying `laplacian_with_pml` operator."""
+    return laplacian_with_pml.default_params(u, medium, omega=omega)
+
+
+@operator(init_params=helmholtz_params)
 def helmholtz(u: OnGrid, medium: Medium, *, omega=1.0, params=None) -> OnGrid:
     r"""Evaluates the Helmholtz operator on a field $`u`$ with a PML. This
     implementation exposes the laplacian parameters to the user.
@@ -276,7 +399,7 @@ def helmholtz(u: OnGrid, medium: Medium, *, omega=1.0, params=None) -> OnGrid:
       OnGrid: Helmholtz operator applied to `u`.
     """
     if params == None:
-        params = laplacian_with_pml.default_params(u, medium, omega=omega)
+        params = helmholtz_params(u, medium, omega=omega)
 
     # Get the modified laplacian
     L = laplacian_with_pml(u, medium, omega=omega, params=params)
@@ -286,6 +409,54 @@ def helmholtz(u: OnGrid, medium: Medium, *, omega=1.0, params=None) -> OnGrid:
     return L + k, params
 
 
+@operator(init_params=helmholtz_params)
+def helmholtz(
+    u: FourierSeries, medium: Medium, *, omega=1.0, params=None
+) -> FourierSeries:
+    r"""Evaluates the Helmholtz operator on a `FourierSeries` field $`u`$ with
+    a PML. The laplacian and the wavenumber term are evaluated by a single
+    kernel, without building the two intermediate fields.
+
+    Args:
+      u (FourierSeries): Complex field.
+      medium (Medium): Medium object.
+      omega (float): Angular frequency.
+      params (None, optional): Parameters for the operator.
+
+    Returns:
+      FourierSeries: Helmholtz operator applied to `u`.
+    """
+    if params == None:
+        params = helmholtz_params(u, medium, omega=omega)
+
+    k_mod = _wavevector_multiplier(medium, omega)
+    out = _fourier_laplacian_with_pml(u, medium, params, k_mod=k_mod)
+    return u.replace_params(jnp.expand_dims(out, -1)), params
+
+
+@jax.jit
+def helmholtz_batched(u: Field, medium: Medium, omegas) -> jnp.ndarray:
+    r"""Evaluates the Helmholtz operator on $`u`$ for a batch of angular
+    frequencies. The operator is mapped with `jax.vmap` over `omegas` and
+    compiled with `jax.jit`, such that a frequency sweep runs as a single
+    program instead of once per frequency.
+
+    Args:
+      u (Field): Complex field.
+      medium (Medium): Medium object.
+      omegas (jnp.ndarray): 1D array of angular frequencies.
+
+    Returns:
+      jnp.ndarray: Parameters of the Helmholtz operator applied to `u`,
+        stacked along a leading axis with one entry per frequency.
+    """
+
+    def single_helmholtz(omega):
+        return helmholtz(u, medium, omega=omega).params
+
+    return jax.vmap(single_helmholtz)(jnp.asarray(omegas))
+
+
 def scale_source_helmholtz(source, medium):
     if isinstance(medium.sound_speed, Field):
         min_sos = functional(medium.sound_speed)(jnp.amin)
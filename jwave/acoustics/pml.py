@@ -32,7 +32,7 @@ def _base_pml(
     def pml_edge(x):
         return x / 2 - medium.pml_size
 
-    delta_pml = jnp.asarray(list(map(pml_edge, medium.domain.N)))
+    delta_pml = jnp.asarray([pml_edge(n) for n in medium.domain.N])
     coord_grid = Domain(N=medium.domain.N, dx=tuple([1.0] * len(medium.domain.N))).grid
     coord_grid = coord_grid + shift
 
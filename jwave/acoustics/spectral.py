@@ -3,6 +3,22 @@ from jax.numpy import ndarray
 from jaxdf.geometry import Domain
 
 
+def _on_axis(k: ndarray, axis: int, ndim: int) -> ndarray:
+  r'''Reshapes the 1D array `k` such that it is broadcasted along
+  `axis` of an `ndim`-dimensional grid.'''
+  shape = [1] * ndim
+  shape[axis] = -1
+  return jnp.reshape(k, shape)
+
+
+def _k_squared(k_vec) -> ndarray:
+  r'''Returns the squared wavenumber magnitude on the grid, given the
+  frequency axes `k_vec`. The squared axes are broadcasted against each
+  other, such that the full wavevector grid is never stacked.'''
+  ndim = len(k_vec)
+  return sum(_on_axis(k ** 2, axis, ndim) for axis, k in enumerate(k_vec))
+
+
 def kspace_op(
   domain: Domain,
   c_ref: float,
@@ -32,8 +48,7 @@ def kspace_op(
   k_vec = [f(n, delta) for n, delta in zip(domain.N, domain.dx)]
 
   # Building k-space operator
-  K = jnp.stack(jnp.meshgrid(*k_vec, indexing='ij'))
-  k_magnitude = jnp.sqrt(jnp.sum(K ** 2, 0))
+  k_magnitude = jnp.sqrt(_k_squared(k_vec))
   k_space_op = jnp.sinc(c_ref * k_magnitude * dt / (2 * jnp.pi))
   parameters = {"k_vec": k_vec, "k_space_op": k_space_op}
   return parameters
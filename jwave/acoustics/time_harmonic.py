@@ -30,6 +30,7 @@ from jaxdf.operators.functions import functional
 from jwave.geometry import Medium
 
 from .operators import helmholtz, scale_source_helmholtz
+from .spectral import _k_squared
 
 
 @operator
@@ -93,9 +94,7 @@ def angular_spectrum(
     pressure_padded = FourierSeries(p, domain)
 
     # Define cutoffs
-    freq_grid = pressure_padded._freq_grid
-    freq_grid = freq_grid.at[0, 0].set(0.0)
-    k_x_sq = jnp.sum(freq_grid**2, axis=-1)
+    k_x_sq = _k_squared(pressure_padded._freq_axis)
     kz = jnp.sqrt(k_t_sq - k_x_sq + 0j)
 
     # Evaluate base propagator
@@ -143,7 +142,7 @@ def _cbs_pml(
     def transform_fun(x):
         return num(x) / den(x)
 
-    delta_pml = jnp.asarray(list(map(pml_edge, medium.domain.N)))
+    delta_pml = jnp.asarray([pml_edge(n) for n in medium.domain.N])
     coord_grid = Domain(N=medium.domain.N, dx=tuple([1.0] * len(medium.domain.N))).grid
     coord_grid = coord_grid
 
@@ -167,7 +166,7 @@ def _cbs_norm_units(medium, omega, k0, src):
     }
 
     # Set discretization to 1
-    dx = tuple(map(lambda x: x / _conversion["dx"], domain.dx))
+    dx = tuple(x / _conversion["dx"] for x in domain.dx)
     domain = Domain(domain.N, dx)
 
     # set omega to 1
@@ -195,7 +194,7 @@ def _cbs_norm_units(medium, omega, k0, src):
 
 def _cbs_unnorm_units(field, conversion):
     domain = field.domain
-    dx = tuple(map(lambda x: x * conversion["dx"], domain.dx))
+    dx = tuple(x * conversion["dx"] for x in domain.dx)
     domain = Domain(domain.N, dx)
 
     return FourierSeries(field.params, domain)
@@ -410,8 +409,7 @@ def homogeneous_helmholtz_green(
     Returns:
       FourierSeries: The result of the Green's operator on $u$.
     """
-    freq_grid = field._freq_grid
-    p_sq = jnp.sum(freq_grid**2, -1)
+    p_sq = _k_squared(field._freq_axis)
 
     g_fourier = 1.0 / (p_sq - (k0**2) - 1j * epsilon)
     u = field.on_grid[..., 0]
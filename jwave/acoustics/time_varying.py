@@ -26,7 +26,7 @@ from jaxdf.operators import (
     sum_over_dims,
 )
 
-from jwave.acoustics.spectral import kspace_op
+from jwave.acoustics.spectral import _on_axis, kspace_op
 from jwave.geometry import (
     Medium,
     MediumAllScalars,
@@ -124,12 +124,10 @@ def momentum_conservation_rhs(
     ]
 
     p_params = p.params[..., 0]
-    Fu = jnp.fft.fftn(p_params)
+    Fu = jnp.fft.fftn(p_params) * k_space_op
 
     def single_grad(axis):
-        Fx = jnp.moveaxis(Fu, axis, -1)
-        k_op = jnp.moveaxis(k_space_op, axis, -1)
-        iku = jnp.moveaxis(Fx * shift_and_k_op[axis] * k_op, -1, axis)
+        iku = Fu * _on_axis(shift_and_k_op[axis], axis, p.ndim)
         return jnp.fft.ifftn(iku).real
 
     dp = jnp.stack([single_grad(i) for i in range(p.ndim)], axis=-1)
@@ -215,9 +213,7 @@ def mass_conservation_rhs(
 
     def single_grad(axis, u):
         Fu = jnp.fft.fftn(u)
-        Fx = jnp.moveaxis(Fu, axis, -1)
-        k_op = jnp.moveaxis(k_space_op, axis, -1)
-        iku = jnp.moveaxis(Fx * shift_and_k_op[axis] * k_op, -1, axis)
+        iku = Fu * k_space_op * _on_axis(shift_and_k_op[axis], axis, p.ndim)
         return jnp.fft.ifftn(iku).real
 
     du = jnp.stack([single_grad(i, u.params[..., i]) for i in range(p.ndim)], axis=-1)
@@ -361,7 +357,7 @@ def simulate_wave_propagation(
         sensors = lambda p, u, rho: p
 
     # Setup parameters
-    output_steps = jnp.arange(0, time_axis.Nt, 1)
+    output_steps = jnp.arange(0, time_axis.Nt, 1, dtype=jnp.int32)
     dt = time_axis.dt
     c_ref = functional(medium.sound_speed)(jnp.amax)
 
@@ -514,7 +510,7 @@ def simulate_wave_propagation(
         sensors = lambda p, u, rho: p
 
     # Setup parameters
-    output_steps = jnp.arange(0, time_axis.Nt, 1)
+    output_steps = jnp.arange(0, time_axis.Nt, 1, dtype=jnp.int32)
     dt = time_axis.dt
     c_ref = functional(medium.sound_speed)(jnp.amax)
     if params == None:
@@ -18,11 +18,12 @@ from dataclasses import dataclass
 from typing import Tuple, Union
 
 import numpy as np
+from jax import lax
 from jax import numpy as jnp
 from jax.tree_util import register_pytree_node_class
 from jaxdf import Field, FourierSeries, OnGrid
 from jaxdf.geometry import Domain
-from jaxdf.operators import dot_product, functional
+from jaxdf.operators import dot_product
 from plum import parametric, type_of
 
 Number = Union[float, int]
@@ -99,7 +100,7 @@ class Medium:
         all_params = sorted(
             ["domain", "sound_speed", "density", "attenuation", "pml_size"]
         )
-        strings = list(map(lambda x: show_param(x), all_params))
+        strings = [show_param(x) for x in all_params]
         return "Medium:\n - " + "\n - ".join(strings)
 
 
@@ -143,21 +144,18 @@ MediumOnGrid = Union[
 
 def _unit_fibonacci_sphere(samples=128):
     # From https://stackoverflow.com/questions/9600801/evenly-distributing-n-points-on-a-sphere
-    points = []
     phi = math.pi * (3.0 - math.sqrt(5.0))  # golden angle in radians
-    for i in range(samples):
-        y = 1 - (i / float(samples - 1)) * 2  # y goes from 1 to -1
-        radius = math.sqrt(1 - y * y)  # radius at y
-        theta = phi * i  # golden angle increment
-        x = math.cos(theta) * radius
-        z = math.sin(theta) * radius
-        points.append((x, y, z))
-    return points
+    i = np.arange(samples)
+    y = 1 - (i / float(samples - 1)) * 2  # y goes from 1 to -1
+    radius = np.sqrt(1 - y * y)  # radius at y
+    theta = phi * i  # golden angle increment
+    x = np.cos(theta) * radius
+    z = np.sin(theta) * radius
+    return np.stack([x, y, z], axis=1)
 
 
 def _fibonacci_sphere(n, radius, centre, cast_int=True):
     points = _unit_fibonacci_sphere(n)
-    points = np.array(points)
     points = points * radius + centre
     if cast_int:
         points = points.astype(int)
@@ -165,27 +163,36 @@ def _fibonacci_sphere(n, radius, centre, cast_int=True):
 
 
 def _circ_mask(N, radius, centre):
-    x, y = np.mgrid[0 : N[0], 0 : N[1]]
-    dist_from_centre = np.sqrt((x - centre[0]) ** 2 + (y - centre[1]) ** 2)
-    mask = (dist_from_centre < radius).astype(int)
+    # Separable squared distances, broadcasted instead of using a full mgrid
+    x = np.arange(N[0])[:, None]
+    y = np.arange(N[1])[None, :]
+    dist_sq = (x - centre[0]) ** 2 + (y - centre[1]) ** 2
+    mask = (dist_sq < radius**2).astype(int)
     return mask
 
 
 def _sphere_mask(N, radius, centre):
-    x, y, z = np.mgrid[0 : N[0], 0 : N[1], 0 : N[2]]
-    dist_from_centre = np.sqrt(
-        (x - centre[0]) ** 2 + (y - centre[1]) ** 2 + (z - centre[2]) ** 2
-    )
-    mask = (dist_from_centre < radius).astype(int)
+    x = np.arange(N[0])[:, None, None]
+    y = np.arange(N[1])[None, :, None]
+    z = np.arange(N[2])[None, None, :]
+    dist_sq = (x - centre[0]) ** 2 + (y - centre[1]) ** 2 + (z - centre[2]) ** 2
+    mask = (dist_sq < radius**2).astype(int)
     return mask
 
 
+def _positions_to_mask(positions, N):
+    # Single scatter for all the points, instead of one per point
+    idx = tuple(jnp.asarray(p, dtype=jnp.int32) for p in positions)
+    return jnp.zeros(N, dtype=bool).at[idx].set(True)
+
+
 @register_pytree_node_class
 class Sources:
     r"""Sources structure
     Attributes:
       positions (Tuple[List[int]): source positions
-      signals (List[jnp.ndarray]): source signals
+      signals (jnp.ndarray): source signals, with shape `(num_sources, num_steps)`.
+        A sequence of 1D signals is stacked into a single array.
     !!! example
       ```python
       x_pos = [10,20,30,40]
@@ -196,11 +203,16 @@ class Sources:
       ```
     """
     positions: Tuple[np.ndarray]
-    signals: Tuple[jnp.ndarray]
+    signals: jnp.ndarray
     dt: float
     domain: Domain
 
     def __init__(self, positions, signals, dt, domain):
+        # Stack the signals once, such that each time step reads a single
+        # column of a 2D array
+        if isinstance(signals, (list, tuple)):
+            signals = jnp.asarray(signals)
+
         self.positions = positions
         self.signals = signals
         self.dt = dt
@@ -227,20 +239,18 @@ class Sources:
         Returns:
           jnp.ndarray: binary mask
         """
-        mask = jnp.zeros(N)
-        for i in range(len(self.positions[0])):
-            mask = mask.at[self.positions[0][i], self.positions[1][i]].set(1)
-        return mask > 0
+        return _positions_to_mask(self.positions, N)
 
     def on_grid(self, n):
-
-        src = jnp.zeros(self.domain.N)
+        # Without sources the mass source vanishes, and no dense field
+        # is allocated at each step
         if len(self.signals) == 0:
-            return src
+            return 0.0
 
+        # Contiguous slice of the signals at step n, rather than a gather
         idx = n.astype(jnp.int32)
-        signals = self.signals[:, idx]
-        src = src.at[self.positions].add(signals)
+        signals = lax.dynamic_index_in_dim(self.signals, idx, axis=1, keepdims=False)
+        src = jnp.zeros(self.domain.N).at[self.positions].add(signals)
         return jnp.expand_dims(src, -1)
 
     @staticmethod
@@ -313,6 +323,7 @@ def get_line_transducer(domain, position, width, angle=0) -> DistributedTransduc
     return DistributedTransducer(mask, [], 0.0, domain)
 
 
+@register_pytree_node_class
 @dataclass
 class TimeHarmonicSource:
     r"""TimeHarmonicSource dataclass
@@ -327,6 +338,17 @@ class TimeHarmonicSource:
     omega: Union[float, Field]
     domain: Domain
 
+    def tree_flatten(self):
+        children = (self.amplitude, self.omega)
+        aux = (self.domain,)
+        return (children, aux)
+
+    @classmethod
+    def tree_unflatten(cls, aux, children):
+        amplitude, omega = children
+        domain = aux[0]
+        return cls(amplitude, omega, domain)
+
     def on_grid(self, t=0.0):
         r"""Returns the complex field corresponding to the
         sources distribution at time $`t`$.
@@ -378,29 +400,31 @@ class Sensors:
         Returns:
           jnp.ndarray: binary mask
         """
-        mask = jnp.zeros(N)
-        for i in range(len(self.positions[0])):
-            mask = mask.at[self.positions[0][i], self.positions[1][i]].set(1)
-        return mask > 0
+        return _positions_to_mask(self.positions, N)
 
     def __call__(self, p: Field, u: Field, rho: Field):
         r"""Returns the values of the field u at the sensors positions.
         Args:
           u (Field): The field to be sampled.
         """
-        if len(self.positions) == 1:
-            return p.on_grid[self.positions[0]]
-        elif len(self.positions) == 2:
-            return p.on_grid[self.positions[0], self.positions[1]]  # type: ignore
-        elif len(self.positions) == 3:
-            return p.on_grid[self.positions[0], self.positions[1], self.positions[2]]  # type: ignore
-        else:
+        if len(self.positions) not in [1, 2, 3]:
             raise ValueError(
                 "Sensors positions must be 1, 2 or 3 dimensional. Not {}".format(
                     len(self.positions)
                 )
             )
 
+        # The sensors are read with a single 1D gather. As for indexing the
+        # grid directly, negative positions count from the end and
+        # out-of-range positions are clamped to the grid
+        field = p.on_grid
+        grid_shape = field.shape[: len(self.positions)]
+        positions = [jnp.asarray(x) for x in self.positions]
+        idx = tuple(jnp.where(x < 0, x + n, x) for x, n in zip(positions, grid_shape))
+        flat_idx = jnp.ravel_multi_index(idx, grid_shape, mode="clip")
+        field = jnp.reshape(field, (-1,) + field.shape[len(self.positions) :])
+        return field[flat_idx]
+
 
 @register_pytree_node_class
 class TimeAxis:
@@ -449,9 +473,15 @@ class TimeAxis:
               it is automatically calculated as the time required to travel
               from one corner of the domain to the opposite one.
         """
-        dt = cfl * min(medium.domain.dx) / functional(medium.sound_speed)(np.max)
+        # Computed on the host, as the result is a Python float
+        sound_speed = medium.sound_speed
+        if isinstance(sound_speed, Field):
+            sound_speed = sound_speed.params
+        sound_speed = np.asarray(sound_speed)
+
+        dt = cfl * min(medium.domain.dx) / float(np.max(sound_speed))
         if t_end is None:
-            t_end = np.sqrt(
-                sum((x[-1] - x[0]) ** 2 for x in medium.domain.spatial_axis)
-            ) / functional(medium.sound_speed)(np.min)
+            N, dx = medium.domain.N, medium.domain.dx
+            domain_diagonal = math.sqrt(sum(((n - 1) * d) ** 2 for n, d in zip(N, dx)))
+            t_end = domain_diagonal / float(np.min(sound_speed))
         return TimeAxis(dt=float(dt), t_end=float(t_end))
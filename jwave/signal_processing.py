@@ -95,7 +95,7 @@ def fourier_upsample(x, upsample=2, discard_last=True):
 
     def _single_upsample(x):
         """adds zeros at appropriate cut values"""
-        new_size = list(map(lambda x: x * upsample, x.shape))
+        new_size = [n * upsample for n in x.shape]
         Fx = jnp.fft.fftshift(jnp.fft.fftn(x))
         new_Fx = jnp.zeros(new_size, dtype=Fx.dtype)
         cuts = [int((upsample - 1) * x / 2 / upsample) for x in new_size]
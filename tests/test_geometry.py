@@ -0,0 +1,127 @@
+# This file is part of j-Wave.
+#
+# j-Wave is free software: you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation, either
+# version 3 of the License, or (at your option) any later version.
+#
+# j-Wave is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with j-Wave. If not, see <https://www.gnu.org/licenses/>.
+
+import jax
+from jax import numpy as jnp
+
+from jwave import FourierSeries
+from jwave.geometry import (
+    Domain,
+    Sensors,
+    Sources,
+    TimeHarmonicSource,
+    _circ_mask,
+    _sphere_mask,
+)
+
+
+def test_to_binary_mask():
+  N = (16, 12)
+  domain = Domain(N, (1., 1.))
+  positions = ([1, 5, 9], [2, 2, 11])
+
+  sources = Sources(positions, jnp.zeros((3, 10)), 1., domain)
+  sensors = Sensors(positions)
+  for mask in [sources.to_binary_mask(N), sensors.to_binary_mask(N)]:
+    assert mask.dtype == jnp.bool_
+    assert mask.shape == N
+    assert jnp.sum(mask) == 3
+    assert mask[1, 2] and mask[5, 2] and mask[9, 11]
+
+
+def test_to_binary_mask_3d():
+  N = (8, 8, 8)
+  sensors = Sensors(([1, 2], [3, 4], [5, 6]))
+  mask = sensors.to_binary_mask(N)
+  assert jnp.sum(mask) == 2
+  assert mask[1, 3, 5] and mask[2, 4, 6]
+
+
+def test_no_sources_mask():
+  N = (16, 12)
+  sources = Sources.no_sources(Domain(N, (1., 1.)))
+  assert not jnp.any(sources.to_binary_mask(N))
+  assert sources.on_grid(jnp.asarray(3)) == 0.0
+
+
+def test_circ_and_sphere_mask():
+  # Points strictly closer than 2 grid points from the centre
+  circ = _circ_mask((8, 8), 2., (3, 4))
+  assert circ.shape == (8, 8)
+  assert circ.sum() == 9
+  assert circ[3, 4] == 1 and circ[5, 4] == 0
+
+  # Scaling the mask must not overflow its dtype
+  assert jnp.max(300 * jnp.asarray(circ)) == 300
+
+  sphere = _sphere_mask((8, 8, 8), 2., (3, 4, 4))
+  assert sphere.shape == (8, 8, 8)
+  assert sphere.sum() == 27
+  assert sphere[3, 4, 4] == 1 and sphere[3, 4, 6] == 0
+  assert jnp.max(300 * jnp.asarray(sphere)) == 300
+
+
+def test_sensors_call():
+  N = (16, 12, 10)
+  domain = Domain(N, (1., 1., 1.))
+  p = FourierSeries(jnp.arange(16*12*10.).reshape(N + (1,)), domain)
+
+  x, y, z = [1, 5, 15], [2, 0, 11], [9, 3, 0]
+  values = Sensors((x, y, z))(p, None, None)
+  assert values.shape == (3, 1)
+  assert jnp.allclose(values, p.on_grid[x, y, z])
+
+  # Sampling only the first two axes returns the remaining ones
+  values = Sensors((x, y))(p, None, None)
+  assert values.shape == (3, 10, 1)
+  assert jnp.allclose(values, p.on_grid[x, y])
+
+  # Out-of-range positions are clamped and negative ones count from the
+  # end, as when indexing the grid
+  x, y = [17, 3, -1, -20], [2, 13, -2, 4]
+  values = Sensors((x, y))(p, None, None)
+  assert jnp.allclose(values, p.on_grid[jnp.asarray(x), jnp.asarray(y)])
+
+  # Positions can be traced
+  @jax.jit
+  def sample(x):
+    return Sensors((x, jnp.asarray([1, 2])))(p, None, None)
+
+  values = sample(jnp.asarray([3, 4]))
+  assert jnp.allclose(values, p.on_grid[[3, 4], [1, 2]])
+
+
+def test_sources_stack_signals():
+  domain = Domain((16, 12), (1., 1.))
+  signal = jnp.sin(jnp.linspace(0, 10, 100))
+  sources = Sources(([1, 5], [2, 2]), [signal, 2 * signal], 1., domain)
+  assert sources.signals.shape == (2, 100)
+
+  src = sources.on_grid(jnp.asarray(10))
+  assert src.shape == (16, 12, 1)
+  assert jnp.allclose(src[5, 2, 0], 2 * signal[10])
+
+
+def test_time_harmonic_source_pytree():
+  domain = Domain((16, 12), (1., 1.))
+  source = TimeHarmonicSource.from_point_sources(domain, [3], [4], 1.0, 2.0)
+
+  @jax.jit
+  def f(source):
+    return source.on_grid(0.5)
+
+  field = f(source)
+  assert jnp.allclose(field[3, 4], jnp.exp(1j))
+  assert len(jax.tree_util.tree_leaves(source)) == 2
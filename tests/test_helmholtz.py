@@ -13,8 +13,17 @@
 # You should have received a copy of the GNU Lesser General Public
 # License along with j-Wave. If not, see <https://www.gnu.org/licenses/>.
 
+import numpy as np
 from jax import numpy as jnp
+from jax.experimental import enable_x64
+from jaxdf.discretization import FiniteDifferences
 
+from jwave.acoustics.operators import (
+    helmholtz,
+    helmholtz_batched,
+    laplacian_with_pml,
+    wavevector,
+)
 from jwave.acoustics.time_harmonic import helmholtz_solver
 from jwave.geometry import Domain, FourierSeries, Medium
 
@@ -43,5 +52,73 @@ def test_if_homog_helmholtz_runs():
         maxiter=10,
     )
 
+
+def test_fused_helmholtz_matches_operators():
+    N = (32, 24)
+    domain = Domain(N, (1., 1.))
+    rng = np.random.RandomState(0)
+    u = rng.randn(*N, 1) + 1j * rng.randn(*N, 1)
+    u = FourierSeries(jnp.asarray(u, dtype=jnp.complex64), domain)
+    sos = 1.0 + 0.1 * jnp.asarray(rng.rand(*N, 1))
+    att = 0.1 * jnp.asarray(rng.rand(*N, 1))
+
+    properties = [
+        {},
+        {"sound_speed": FourierSeries(sos, domain)},
+        {"attenuation": FourierSeries(att, domain)},
+        {"sound_speed": sos},
+        {"attenuation": att},
+        {"sound_speed": sos, "attenuation": att},
+    ]
+    for kwargs in properties:
+        medium = Medium(domain, pml_size=5, **kwargs)
+        out = helmholtz(u, medium, omega=1.0)
+        expected = laplacian_with_pml(u, medium, omega=1.0) + wavevector(
+            u, medium, omega=1.0
+        )
+        assert out.params.shape == N + (1,)
+        assert jnp.allclose(out.params, expected.params, atol=1e-5)
+
+
+def test_operators_keep_field_precision():
+    N = (16, 12)
+    domain = Domain(N, (1., 1.))
+    with enable_x64():
+        u = jnp.ones(N + (1,), dtype=jnp.complex64)
+        rho0 = jnp.ones(N + (1,)).at[4:8].set(1.5)
+        cases = [
+            (FourierSeries(u, domain), Medium(domain, pml_size=3)),
+            (
+                FourierSeries(u, domain),
+                Medium(domain, density=FourierSeries(rho0, domain), pml_size=3),
+            ),
+            (FiniteDifferences(u, domain), Medium(domain, pml_size=3)),
+            (
+                FiniteDifferences(u, domain),
+                Medium(domain, density=FiniteDifferences(rho0, domain), pml_size=3),
+            ),
+        ]
+        for field, medium in cases:
+            for op in [laplacian_with_pml, helmholtz]:
+                out = op(field, medium, omega=1.0)
+                assert out.params.dtype == jnp.complex64
+
+
+def test_helmholtz_batched():
+    N = (32, 24)
+    domain = Domain(N, (1., 1.))
+    u = jnp.zeros(N).astype(jnp.complex64)
+    u = u.at[16, 12].set(1.0)
+    u = FourierSeries(jnp.expand_dims(u, axis=-1), domain)
+    medium = Medium(domain, sound_speed=1.0, pml_size=5)
+
+    omegas = jnp.asarray([0.5, 1.0, 2.0])
+    out = helmholtz_batched(u, medium, omegas)
+    assert out.shape == (3,) + N + (1,)
+    for i, omega in enumerate(omegas):
+        expected = helmholtz(u, medium, omega=omega)
+        assert jnp.allclose(out[i], expected.params, atol=1e-5)
+
+
 if __name__ == "__main__":
     test_if_homog_helmholtz_runs()